@@ -25,62 +25,286 @@ Usage:
 import argparse
 import json
 import sys
-from typing import Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
 
-import requests
+if TYPE_CHECKING:
+    import requests
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:  # orjson is optional; stdlib json also accepts bytes
+    orjson = None
+    _json_loads = json.loads
+
+    def _json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+# Request bodies are pre-serialized, so the content type is set explicitly
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
 OLLAMA_HOST = "http://localhost:11434"  # Change if your server listens elsewhere
+STDOUT_FLUSH_INTERVAL = 0.05  # Seconds between terminal flushes while streaming
+
+# Shared session so repeated requests reuse the same keep-alive connection.
+# Created on first use so `-h` and argument errors don't pay for importing requests;
+# the lock keeps concurrent first calls (e.g. GUI worker threads) from racing.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _get_session() -> "requests.Session":
+    """Return the shared HTTP session, creating it on first use."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _SESSION = requests.Session()
+            _SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+            _SESSION.headers.update({"Connection": "keep-alive"})
+        return _SESSION
+
+
+def close_session() -> None:
+    """Close the shared HTTP session if it was created."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
+
+
+def _iter_lines(resp: "requests.Response", buf: bytearray) -> Iterator[bytearray]:
+    """Yield non-empty newline-delimited lines from a streaming response.
+
+    ``buf`` is cleared and reused as the working buffer, so repeated calls
+    don't reallocate it; yielded lines are independent copies.
+    """
+    buf.clear()
+    scan_from = 0  # Bytes before this offset are known not to contain a newline
+    for chunk in resp.iter_content(chunk_size=4096, decode_unicode=False):
+        if not chunk:
+            continue
+        buf += chunk
+        while True:
+            nl = buf.find(b"\n", scan_from)
+            if nl < 0:
+                scan_from = len(buf)
+                break
+            # A bytearray slice is already a copy; the JSON parsers and
+            # _fast_response accept it without converting to bytes first.
+            line = buf[:nl]
+            del buf[:nl + 1]
+            scan_from = 0
+            if line:
+                yield line
+    # Server closed the stream without a trailing newline
+    if buf:
+        yield buf[:]
+
+
+_RESPONSE_KEY = b'"response":"'
+
+
+def _fast_response(line: bytearray) -> Optional[str]:
+    """Extract the "response" text from a non-final stream line without parsing it.
+
+    Returns None when the line needs a full JSON parse (escape sequences,
+    the final ``done`` record, or an unexpected layout).
+    """
+    # Without backslashes no string can contain an escaped quote, so the next
+    # quote after the key closes the value. The final record carries the
+    # timing stats and always takes the full parse.
+    if b"\\" in line or b'"done":false' not in line:
+        return None
+    start = line.find(_RESPONSE_KEY)
+    if start < 0:
+        return None
+    start += len(_RESPONSE_KEY)
+    end = line.find(b'"', start)
+    if end < 0:
+        return None
+    return line[start:end].decode("utf-8")
 
 
 def _print_verbose_stats(data: dict) -> None:
     """Print verbose statistics from Ollama response."""
-    print("\n" + "=" * 70, file=sys.stderr)
-    print("OLLAMA VERBOSE OUTPUT", file=sys.stderr)
-    print("=" * 70, file=sys.stderr)
+    get = data.get
+    rule = "=" * 70
+    lines = ["", rule, "OLLAMA VERBOSE OUTPUT", rule]
     
     # Model information
     if "model" in data:
-        print(f"Model: {data['model']}", file=sys.stderr)
+        lines.append(f"Model: {data['model']}")
     
-    # Timing information
-    total_duration = data.get("total_duration", 0) / 1e9  # Convert nanoseconds to seconds
-    load_duration = data.get("load_duration", 0) / 1e9
-    prompt_eval_duration = data.get("prompt_eval_duration", 0) / 1e9
-    eval_duration = data.get("eval_duration", 0) / 1e9
+    # Timing information (nanoseconds -> seconds)
+    total_duration = get("total_duration", 0) / 1e9
+    load_duration = get("load_duration", 0) / 1e9
+    prompt_eval_duration = get("prompt_eval_duration", 0) / 1e9
+    eval_duration = get("eval_duration", 0) / 1e9
     
-    print(f"\nTiming:", file=sys.stderr)
-    print(f"  Total Duration:         {total_duration:.3f}s", file=sys.stderr)
-    print(f"  Model Load Duration:    {load_duration:.3f}s", file=sys.stderr)
-    print(f"  Prompt Eval Duration:   {prompt_eval_duration:.3f}s", file=sys.stderr)
-    print(f"  Generation Duration:    {eval_duration:.3f}s", file=sys.stderr)
+    lines += [
+        "",
+        "Timing:",
+        f"  Total Duration:         {total_duration:.3f}s",
+        f"  Model Load Duration:    {load_duration:.3f}s",
+        f"  Prompt Eval Duration:   {prompt_eval_duration:.3f}s",
+        f"  Generation Duration:    {eval_duration:.3f}s",
+    ]
     
     # Token counts
-    prompt_eval_count = data.get("prompt_eval_count", 0)
-    eval_count = data.get("eval_count", 0)
+    prompt_eval_count = get("prompt_eval_count", 0)
+    eval_count = get("eval_count", 0)
     
-    print(f"\nTokens:", file=sys.stderr)
-    print(f"  Prompt Tokens:          {prompt_eval_count}", file=sys.stderr)
-    print(f"  Generated Tokens:       {eval_count}", file=sys.stderr)
-    print(f"  Total Tokens:           {prompt_eval_count + eval_count}", file=sys.stderr)
+    lines += [
+        "",
+        "Tokens:",
+        f"  Prompt Tokens:          {prompt_eval_count}",
+        f"  Generated Tokens:       {eval_count}",
+        f"  Total Tokens:           {prompt_eval_count + eval_count}",
+    ]
     
     # Performance metrics
     if prompt_eval_duration > 0 and prompt_eval_count > 0:
         prompt_tokens_per_sec = prompt_eval_count / prompt_eval_duration
-        print(f"  Prompt Eval Speed:      {prompt_tokens_per_sec:.1f} tokens/s", file=sys.stderr)
+        lines.append(f"  Prompt Eval Speed:      {prompt_tokens_per_sec:.1f} tokens/s")
     
     if eval_duration > 0 and eval_count > 0:
         gen_tokens_per_sec = eval_count / eval_duration
-        print(f"  Generation Speed:       {gen_tokens_per_sec:.1f} tokens/s", file=sys.stderr)
+        lines.append(f"  Generation Speed:       {gen_tokens_per_sec:.1f} tokens/s")
     
     # Done reason
     if "done_reason" in data:
-        print(f"\nCompletion Reason: {data['done_reason']}", file=sys.stderr)
+        lines += ["", f"Completion Reason: {data['done_reason']}"]
     
     # Context size
     if "context" in data:
-        print(f"Context Size: {len(data['context'])} tokens", file=sys.stderr)
+        lines.append(f"Context Size: {len(data['context'])} tokens")
+    
+    lines.append(rule)
+    sys.stderr.write("\n".join(lines) + "\n")
+
+
+def make_generator(model: str = "gpt-oss:20b",
+                   stream: bool = True,
+                   timeout: int = 300,
+                   num_gpu: Optional[int] = 99,
+                   verbose: bool = False) -> Callable[[str], Optional[str]]:
+    """
+    Build a prompt -> text function specialized for a fixed configuration.
+
+    The request payload is built once and only its "prompt" field changes
+    between calls, and the stream/non-stream path is chosen here rather than
+    on every call. Parameters have the same meaning as in `generate`.
+
+    Returns
+    -------
+    callable
+        A function taking a prompt and behaving like `generate` called with
+        the same keyword arguments.
+    """
+    import requests
+
+    session = _get_session()
+    url = f"{OLLAMA_HOST}/api/generate"
+    payload = {
+        "model": model,
+        "prompt": "",
+        "stream": stream,
+    }
+    
+    # Add GPU control options if specified
+    if num_gpu is not None:
+        payload["options"] = {"num_gpu": num_gpu}
     
-    print("=" * 70, file=sys.stderr)
+    # Line buffer and pending terminal output, reused across calls of this generator
+    line_buf = bytearray()
+    out_buf = []
+
+    def generate_stream(prompt: str) -> None:
+        # Handle the response as a stream of JSON chunks
+        payload["prompt"] = prompt
+        last_data = None
+        # On a terminal, batch chunks and flush on newline or every
+        # STDOUT_FLUSH_INTERVAL; when piped, rely on stdio block buffering.
+        interactive = sys.stdout.isatty()
+        out_buf.clear()
+        last_flush = time.monotonic()
+        body = _json_dumps(payload)
+        with session.post(url, data=body, headers=_JSON_HEADERS, stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            content_encoding = resp.headers.get("Content-Encoding", "")
+            try:
+                for line in _iter_lines(resp, line_buf):
+                    # Ollama streams lines that look like: {"response":"..."}\n
+                    # The "response" key contains the chunk that was just produced
+                    chunk = _fast_response(line)
+                    if chunk is None:
+                        data = _json_loads(line)
+                        chunk = data["response"] if "response" in data else ""
+                        # Keep the last data object to get statistics
+                        if data.get("done"):
+                            last_data = data
+                    if not chunk:
+                        continue
+                    if not interactive:
+                        sys.stdout.write(chunk)
+                    else:
+                        out_buf.append(chunk)
+                        now = time.monotonic()
+                        if "\n" in chunk or now - last_flush > STDOUT_FLUSH_INTERVAL:
+                            sys.stdout.write("".join(out_buf))
+                            sys.stdout.flush()
+                            out_buf.clear()
+                            last_flush = now
+            finally:
+                if out_buf:
+                    sys.stdout.write("".join(out_buf))
+                    sys.stdout.flush()
+        print()  # newline after streaming ends
+        
+        # Display verbose statistics if requested
+        if verbose and last_data:
+            _print_verbose_stats(last_data)
+            if content_encoding:
+                print(f"Content-Encoding: {content_encoding}", file=sys.stderr)
+        
+        return None
+
+    def generate_once(prompt: str) -> str:
+        payload["prompt"] = prompt
+        body = _json_dumps(payload)
+        resp = session.post(url, data=body, headers=_JSON_HEADERS, timeout=timeout)
+        resp.raise_for_status()
+        data = _json_loads(resp.content)
+        
+        # Display verbose statistics if requested
+        if verbose:
+            _print_verbose_stats(data)
+            content_encoding = resp.headers.get("Content-Encoding")
+            if content_encoding:
+                print(f"Content-Encoding: {content_encoding}", file=sys.stderr)
+        
+        return data.get("response", "")
+
+    run = generate_stream if stream else generate_once
+
+    def generator(prompt: str) -> Optional[str]:
+        try:
+            return run(prompt)
+        except requests.exceptions.RequestException as e:
+            print(f"[Error] Could not reach Ollama server: {e}", file=sys.stderr)
+            return None
+        except json.JSONDecodeError as e:  # orjson.JSONDecodeError is a subclass
+            print(f"[Error] Invalid JSON from server: {e}", file=sys.stderr)
+            return None
+
+    return generator
 
 
 def generate(prompt: str,
@@ -118,58 +342,8 @@ response (default: True).
         The final generated text (if `stream` is False).  When `stream` is
         True the function prints the output in real time and returns None.
     """
-    url = f"{OLLAMA_HOST}/api/generate"
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": stream,
-    }
-    
-    # Add GPU control options if specified
-    if num_gpu is not None:
-        payload["options"] = {"num_gpu": num_gpu}
-
-    try:
-        # If streaming, we need to handle the response as a stream of JSON chunks
-        if stream:
-            last_data = None
-            with requests.post(url, json=payload, stream=True, timeout=timeout) as resp:
-                resp.raise_for_status()
-                for line in resp.iter_lines():
-                    if not line:
-                        continue
-                    # Ollama streams lines that look like: {"response":"..."}\n
-                    data = json.loads(line.decode("utf-8"))
-                    # The "response" key contains the chunk that was just produced
-                    chunk = data.get("response", "")
-                    sys.stdout.write(chunk)
-                    sys.stdout.flush()
-                    # Keep the last data object to get statistics
-                    if data.get("done", False):
-                        last_data = data
-            print()  # newline after streaming ends
-            
-            # Display verbose statistics if requested
-            if verbose and last_data:
-                _print_verbose_stats(last_data)
-            
-            return None
-        else:
-            resp = requests.post(url, json=payload, timeout=timeout)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            # Display verbose statistics if requested
-            if verbose:
-                _print_verbose_stats(data)
-            
-            return data.get("response", "")
-    except requests.exceptions.RequestException as e:
-        print(f"[Error] Could not reach Ollama server: {e}", file=sys.stderr)
-        return None
-    except json.JSONDecodeError as e:
-        print(f"[Error] Invalid JSON from server: {e}", file=sys.stderr)
-        return None
+    return make_generator(model=model, stream=stream, timeout=timeout,
+                          num_gpu=num_gpu, verbose=verbose)(prompt)
 
 
 def parse_args() -> argparse.Namespace:
@@ -220,8 +394,9 @@ def main() -> None:
     args = parse_args()
     if args.verbose:
         print(args, file=sys.stderr)
-    result = generate(args.prompt, model=args.model, stream=args.stream, 
-                     num_gpu=args.num_gpu, verbose=args.verbose)
+    run = make_generator(model=args.model, stream=args.stream,
+                         num_gpu=args.num_gpu, verbose=args.verbose)
+    result = run(args.prompt)
     if result is not None:
         print(result)
 
@@ -6,13 +6,22 @@ Ollama GUI Client - Tkinter interface for Ollama text generation
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import threading
+import queue
 import json
-import requests
+import socket
+from concurrent.futures import ThreadPoolExecutor
+import os
 from typing import Optional
 import sys
+import time
 from datetime import datetime
 
+from ollama_client import (_JSON_HEADERS, _fast_response, _get_session, _iter_lines,
+                           _json_dumps, _json_loads, close_session)
+
 OLLAMA_HOST = "http://localhost:11434"  # Change if your server listens elsewhere
+MAX_OUTPUT_LINES = 5000  # Oldest output lines are dropped beyond this
+MODELS_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "oclient", "models.json")
 
 
 class OllamaGUI:
@@ -20,6 +29,11 @@ class OllamaGUI:
         self.root = root
         self.root.title("Ollama GUI Client")
         self.root.geometry("900x700")
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        
+        # Worker pool for short background requests (model list, model info)
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        self._closed = False  # Set once the window is closing; pool results are dropped
         
         # Variables
         self.model_var = tk.StringVar(value="gpt-oss:20b")
@@ -28,6 +42,23 @@ class OllamaGUI:
         self.is_generating = False
         self.auto_scroll = True  # Track if we should auto-scroll output
         
+        # Streamed chunks are buffered and flushed to the widget at ~30 Hz
+        self._chunk_buffer = []
+        self._chunk_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._last_trim = 0.0
+        
+        # Set by stop_generation; the active streaming response is closed to abort it
+        self._cancel_evt = threading.Event()
+        self._active_resp = None
+        
+        # Reused by every streaming generation to avoid reallocating it
+        self._line_buf = bytearray()
+        
+        # Raw stream lines handed from the network thread to the parser thread
+        self._line_q = queue.Queue(maxsize=512)
+        self._parse_error = None
+        
         # Available models
         self.available_models = []
         
@@ -37,6 +68,11 @@ class OllamaGUI:
         # Load available models
         self.load_models()
         
+    @property
+    def session(self):
+        """HTTP session (keep-alive) shared by all requests"""
+        return _get_session()
+    
     def setup_ui(self):
         """Setup the user interface"""
         
@@ -69,7 +105,8 @@ class OllamaGUI:
         stats_frame.pack(fill=tk.X, padx=10, pady=5)
         
         # Create a grid layout for stats
-        self.stats_model_label = ttk.Label(stats_frame, text="Model: -", font=("Arial", 9, "bold"))
+        self._sv_model = tk.StringVar(value="Model: -")
+        self.stats_model_label = ttk.Label(stats_frame, textvariable=self._sv_model, font=("Arial", 9, "bold"))
         self.stats_model_label.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=2)
         
         self.stats_url_label = ttk.Label(stats_frame, text=f"URL: {OLLAMA_HOST}", font=("Arial", 9, "bold"))
@@ -77,34 +114,44 @@ class OllamaGUI:
         
         # Timing stats
         ttk.Label(stats_frame, text="Timing:", font=("Arial", 9, "bold")).grid(row=1, column=0, sticky=tk.W, pady=2)
-        self.stats_total_label = ttk.Label(stats_frame, text="Total: -", font=("Arial", 9, "bold"))
+        self._sv_total = tk.StringVar(value="Total: -")
+        self.stats_total_label = ttk.Label(stats_frame, textvariable=self._sv_total, font=("Arial", 9, "bold"))
         self.stats_total_label.grid(row=1, column=1, sticky=tk.W, padx=10)
-        self.stats_load_label = ttk.Label(stats_frame, text="Load: -", font=("Arial", 9, "bold"))
+        self._sv_load = tk.StringVar(value="Load: -")
+        self.stats_load_label = ttk.Label(stats_frame, textvariable=self._sv_load, font=("Arial", 9, "bold"))
         self.stats_load_label.grid(row=1, column=2, sticky=tk.W, padx=10)
-        self.stats_prompt_eval_label = ttk.Label(stats_frame, text="Prompt Eval: -", font=("Arial", 9, "bold"))
+        self._sv_prompt_eval = tk.StringVar(value="Prompt Eval: -")
+        self.stats_prompt_eval_label = ttk.Label(stats_frame, textvariable=self._sv_prompt_eval, font=("Arial", 9, "bold"))
         self.stats_prompt_eval_label.grid(row=1, column=3, sticky=tk.W, padx=10)
         
-        self.stats_gen_label = ttk.Label(stats_frame, text="Generation: -", font=("Arial", 9, "bold"))
+        self._sv_gen = tk.StringVar(value="Generation: -")
+        self.stats_gen_label = ttk.Label(stats_frame, textvariable=self._sv_gen, font=("Arial", 9, "bold"))
         self.stats_gen_label.grid(row=2, column=1, columnspan=3, sticky=tk.W, padx=10, pady=2)
         
         # Token stats
         ttk.Label(stats_frame, text="Tokens:", font=("Arial", 9, "bold")).grid(row=3, column=0, sticky=tk.W, pady=2)
-        self.stats_prompt_tokens_label = ttk.Label(stats_frame, text="Prompt: -", font=("Arial", 9, "bold"))
+        self._sv_prompt_tokens = tk.StringVar(value="Prompt: -")
+        self.stats_prompt_tokens_label = ttk.Label(stats_frame, textvariable=self._sv_prompt_tokens, font=("Arial", 9, "bold"))
         self.stats_prompt_tokens_label.grid(row=3, column=1, sticky=tk.W, padx=10)
-        self.stats_gen_tokens_label = ttk.Label(stats_frame, text="Generated: -", font=("Arial", 9, "bold"))
+        self._sv_gen_tokens = tk.StringVar(value="Generated: -")
+        self.stats_gen_tokens_label = ttk.Label(stats_frame, textvariable=self._sv_gen_tokens, font=("Arial", 9, "bold"))
         self.stats_gen_tokens_label.grid(row=3, column=2, sticky=tk.W, padx=10)
-        self.stats_total_tokens_label = ttk.Label(stats_frame, text="Total: -", font=("Arial", 9, "bold"))
+        self._sv_total_tokens = tk.StringVar(value="Total: -")
+        self.stats_total_tokens_label = ttk.Label(stats_frame, textvariable=self._sv_total_tokens, font=("Arial", 9, "bold"))
         self.stats_total_tokens_label.grid(row=3, column=3, sticky=tk.W, padx=10)
         
         # Performance stats
         ttk.Label(stats_frame, text="Performance:", font=("Arial", 9, "bold")).grid(row=4, column=0, sticky=tk.W, pady=2)
-        self.stats_prompt_speed_label = ttk.Label(stats_frame, text="Prompt Eval: -", font=("Arial", 9, "bold"))
+        self._sv_prompt_speed = tk.StringVar(value="Prompt Eval: -")
+        self.stats_prompt_speed_label = ttk.Label(stats_frame, textvariable=self._sv_prompt_speed, font=("Arial", 9, "bold"))
         self.stats_prompt_speed_label.grid(row=4, column=1, columnspan=2, sticky=tk.W, padx=10)
-        self.stats_gen_speed_label = ttk.Label(stats_frame, text="Generation: -", font=("Arial", 9, "bold"))
+        self._sv_gen_speed = tk.StringVar(value="Generation: -")
+        self.stats_gen_speed_label = ttk.Label(stats_frame, textvariable=self._sv_gen_speed, font=("Arial", 9, "bold"))
         self.stats_gen_speed_label.grid(row=4, column=3, sticky=tk.W, padx=10)
         
         # Completion info
-        self.stats_completion_label = ttk.Label(stats_frame, text="Status: No generation yet", 
+        self._sv_completion = tk.StringVar(value="Status: No generation yet")
+        self.stats_completion_label = ttk.Label(stats_frame, textvariable=self._sv_completion, 
                                                 font=("Arial", 9, "bold"), foreground="gray")
         self.stats_completion_label.grid(row=5, column=0, columnspan=4, sticky=tk.W, pady=2)
         
@@ -173,18 +220,93 @@ class OllamaGUI:
         self.output_text.vbar.bind("<ButtonRelease-1>", self._on_scrollbar_release)
         
     def load_models(self):
-        """Load available models from Ollama"""
+        """Show cached models immediately, then refresh from Ollama in the background"""
+        cached = self._read_models_cache()
+        if cached:
+            self._apply_models(cached)
+        
+        # Fetch the model list and probe the selected model concurrently
+        models_future = self._io_pool.submit(self._fetch_models)
+        models_future.add_done_callback(self._on_models_fetched)
+        info_future = self._io_pool.submit(self._fetch_model_info, self.model_var.get())
+        info_future.add_done_callback(self._on_model_info_fetched)
+    
+    def _read_models_cache(self):
+        """Return the model list saved by the last successful refresh"""
         try:
-            resp = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
-            data = resp.json()
-            self.available_models = [model["name"] for model in data.get("models", [])]
-            self.model_combo["values"] = self.available_models
-            
-            if self.available_models and self.model_var.get() not in self.available_models:
-                self.model_var.set(self.available_models[0])
-                
+            with open(MODELS_CACHE_FILE, "rb") as f:
+                models = _json_loads(f.read())
+        except (OSError, ValueError):
+            return []
+        return models if isinstance(models, list) else []
+    
+    def _fetch_models(self):
+        """Fetch available model names from Ollama and refresh the cache (runs in pool)"""
+        resp = self.session.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
+        resp.raise_for_status()
+        data = _json_loads(resp.content)
+        models = [model["name"] for model in data.get("models", [])]
+        
+        try:
+            os.makedirs(os.path.dirname(MODELS_CACHE_FILE), exist_ok=True)
+            with open(MODELS_CACHE_FILE, "w") as f:
+                json.dump(models, f)
+        except OSError:
+            pass  # Cache is best-effort
+        return models
+    
+    def _fetch_model_info(self, model):
+        """Fetch details for a model from Ollama (runs in pool)"""
+        resp = self.session.post(f"{OLLAMA_HOST}/api/show", data=_json_dumps({"model": model}),
+                                 headers=_JSON_HEADERS, timeout=5)
+        resp.raise_for_status()
+        return model, _json_loads(resp.content)
+    
+    def _on_models_fetched(self, future):
+        """Hand the model list result to the main thread"""
+        try:
+            models = future.result()
         except Exception as e:
-            self.output_text.insert(tk.END, f"Error loading models: {e}\n")
+            self._post_to_ui(self._load_models_failed, e)
+            return
+        self._post_to_ui(self._apply_models, models)
+    
+    def _on_model_info_fetched(self, future):
+        """Hand the model info result to the main thread"""
+        try:
+            model, info = future.result()
+        except Exception:
+            return  # The probe is optional; generation reports real errors
+        self._post_to_ui(self._apply_model_info, model, info)
+    
+    def _post_to_ui(self, func, *args):
+        """Schedule func on the main thread unless the window has been closed"""
+        if self._closed:
+            return
+        try:
+            self.root.after(0, func, *args)
+        except (RuntimeError, tk.TclError):
+            pass  # Window was destroyed in the meantime
+    
+    def _apply_models(self, models):
+        """Populate the model selector (called from main thread)"""
+        self.available_models = models
+        self.model_combo["values"] = self.available_models
+        
+        if self.available_models and self.model_var.get() not in self.available_models:
+            self.model_var.set(self.available_models[0])
+    
+    def _apply_model_info(self, model, info):
+        """Show the probed model's details in the stats panel (called from main thread)"""
+        details = info.get("details", {})
+        extras = [details[key] for key in ("parameter_size", "quantization_level") if details.get(key)]
+        suffix = f" ({', '.join(extras)})" if extras else ""
+        self._sv_model.set(f"Model: {model}{suffix}")
+    
+    def _load_models_failed(self, error):
+        """Report a failed model refresh (called from main thread)"""
+        self.output_text.insert(tk.END, f"Error loading models: {error}\n")
+        if not self.available_models:
             self.model_combo["values"] = ["gpt-oss:20b", "qwen3-coder"]
     
     def _is_at_bottom(self):
@@ -244,7 +366,7 @@ class OllamaGUI:
         
         # Model info
         if "model" in data:
-            self.stats_model_label.config(text=f"Model: {data['model']}")
+            self._sv_model.set(f"Model: {data['model']}")
         
         # Timing
         total_duration = data.get("total_duration", 0) / 1e9
@@ -252,38 +374,36 @@ class OllamaGUI:
         prompt_eval_duration = data.get("prompt_eval_duration", 0) / 1e9
         eval_duration = data.get("eval_duration", 0) / 1e9
         
-        self.stats_total_label.config(text=f"Total: {total_duration:.3f}s")
-        self.stats_load_label.config(text=f"Load: {load_duration:.3f}s")
-        self.stats_prompt_eval_label.config(text=f"Prompt Eval: {prompt_eval_duration:.3f}s")
-        self.stats_gen_label.config(text=f"Generation: {eval_duration:.3f}s")
+        self._sv_total.set(f"Total: {total_duration:.3f}s")
+        self._sv_load.set(f"Load: {load_duration:.3f}s")
+        self._sv_prompt_eval.set(f"Prompt Eval: {prompt_eval_duration:.3f}s")
+        self._sv_gen.set(f"Generation: {eval_duration:.3f}s")
         
         # Tokens
         prompt_eval_count = data.get("prompt_eval_count", 0)
         eval_count = data.get("eval_count", 0)
         
-        self.stats_prompt_tokens_label.config(text=f"Prompt: {prompt_eval_count}")
-        self.stats_gen_tokens_label.config(text=f"Generated: {eval_count}")
-        self.stats_total_tokens_label.config(text=f"Total: {prompt_eval_count + eval_count}")
+        self._sv_prompt_tokens.set(f"Prompt: {prompt_eval_count}")
+        self._sv_gen_tokens.set(f"Generated: {eval_count}")
+        self._sv_total_tokens.set(f"Total: {prompt_eval_count + eval_count}")
         
         # Performance
         if prompt_eval_duration > 0 and prompt_eval_count > 0:
             prompt_speed = prompt_eval_count / prompt_eval_duration
-            self.stats_prompt_speed_label.config(text=f"Prompt Eval: {prompt_speed:.1f} tok/s")
+            self._sv_prompt_speed.set(f"Prompt Eval: {prompt_speed:.1f} tok/s")
         else:
-            self.stats_prompt_speed_label.config(text="Prompt Eval: -")
+            self._sv_prompt_speed.set("Prompt Eval: -")
         
         if eval_duration > 0 and eval_count > 0:
             gen_speed = eval_count / eval_duration
-            self.stats_gen_speed_label.config(text=f"Generation: {gen_speed:.1f} tok/s")
+            self._sv_gen_speed.set(f"Generation: {gen_speed:.1f} tok/s")
         else:
-            self.stats_gen_speed_label.config(text="Generation: -")
+            self._sv_gen_speed.set("Generation: -")
         
         # Done reason
         if "done_reason" in data:
-            self.stats_completion_label.config(
-                text=f"Status: Completed ({data['done_reason']})",
-                foreground="green"
-            )
+            self._sv_completion.set(f"Status: Completed ({data['done_reason']})")
+            self.stats_completion_label.config(foreground="green")
     
     def generate(self):
         """Start generation in a separate thread"""
@@ -298,6 +418,7 @@ class OllamaGUI:
         
         # Disable controls
         self.is_generating = True
+        self._cancel_evt.clear()
         self.auto_scroll = True  # Reset auto-scroll for new generation
         self.generate_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
@@ -306,10 +427,12 @@ class OllamaGUI:
         # Get system prompt
         system_prompt = self.system_prompt_entry.get("1.0", tk.END).strip()
         
-        # Display prompt with colored text
+        # Display prompt with colored text, after any output still buffered
+        self._flush_chunks()
         self.output_text.insert(tk.END, "\n")
         self.output_text.insert(tk.END, f"[{datetime.now().strftime('%H:%M:%S')}] ", "time")
         self.output_text.insert(tk.END, f"Prompt: {prompt}\n", "prompt")
+        self._trim_output()
         self.output_text.see(tk.END)
         
         # Start generation thread
@@ -344,61 +467,144 @@ class OllamaGUI:
                 self._generate_non_stream(url, payload)
                 
         except Exception as e:
-            self.root.after(0, self._append_output, f"\n[ERROR] {e}\n")
-            self.root.after(0, self.update_status, "Error", "red")
+            self._post_to_ui(self._append_output, f"\n[ERROR] {e}\n")
+            self._post_to_ui(self.update_status, "Error", "red")
         finally:
-            self.root.after(0, self._generation_complete)
+            self._post_to_ui(self._generation_complete)
     
     def _generate_stream(self, url, payload):
-        """Handle streaming generation"""
+        """Handle streaming generation (network reader)"""
+        self._parse_error = None
+        parser = threading.Thread(target=self._parser_thread)
+        parser.daemon = True
+        parser.start()
+        
+        try:
+            body = _json_dumps(payload)
+            with self.session.post(url, data=body, headers=_JSON_HEADERS, stream=True, timeout=300) as resp:
+                self._active_resp = resp
+                resp.raise_for_status()
+                for line in _iter_lines(resp, self._line_buf):
+                    if self._cancel_evt.is_set() or self._parse_error:
+                        break
+                    self._line_q.put(line)
+        except Exception:
+            # Closing the response from stop_generation interrupts the read
+            if not self._cancel_evt.is_set():
+                raise
+        finally:
+            self._active_resp = None
+            self._line_q.put(None)  # Tell the parser the stream has ended
+            parser.join()
+        
+        if self._parse_error:
+            raise self._parse_error
+    
+    def _parser_thread(self):
+        """Decode queued stream lines and buffer their text for display"""
         last_data = None
         
-        with requests.post(url, json=payload, stream=True, timeout=300) as resp:
-            resp.raise_for_status()
-            for line in resp.iter_lines():
-                if not self.is_generating:
-                    break
+        while True:
+            line = self._line_q.get()
+            if line is None:
+                break
+            if self._parse_error or self._cancel_evt.is_set():
+                continue  # Keep draining so the reader never blocks on a full queue
+            
+            # Any failure here must not kill the thread, or the reader would
+            # block forever once the queue fills up
+            try:
+                chunk = _fast_response(line)
+                if chunk is None:
+                    data = _json_loads(line)
+                    chunk = data.get("response", "")
                     
-                if not line:
-                    continue
-                
-                data = json.loads(line.decode("utf-8"))
-                chunk = data.get("response", "")
+                    if data.get("done", False):
+                        last_data = data
                 
                 if chunk:
-                    self.root.after(0, self._append_output, chunk)
-                
-                if data.get("done", False):
-                    last_data = data
+                    self._queue_output(chunk)
+            except Exception as e:
+                self._parse_error = e
         
-        self.root.after(0, self._append_output, "\n")
-        
-        # Always show stats
-        if last_data:
-            self.root.after(0, self.update_stats, last_data)
+        try:
+            self._queue_output("\n")
+            
+            # Always show stats
+            if last_data:
+                self._post_to_ui(self.update_stats, last_data)
+        except (RuntimeError, tk.TclError):
+            pass  # Window was closed
     
     def _generate_non_stream(self, url, payload):
         """Handle non-streaming generation"""
-        resp = requests.post(url, json=payload, timeout=300)
+        body = _json_dumps(payload)
+        resp = self.session.post(url, data=body, headers=_JSON_HEADERS, timeout=300)
         resp.raise_for_status()
-        data = resp.json()
+        data = _json_loads(resp.content)
         
         response_text = data.get("response", "")
-        self.root.after(0, self._append_output, response_text)
-        self.root.after(0, self._append_output, "\n")
+        self._post_to_ui(self._append_output, response_text)
+        self._post_to_ui(self._append_output, "\n")
         
         # Always show stats
-        self.root.after(0, self.update_stats, data)
+        self._post_to_ui(self.update_stats, data)
+    
+    def _queue_output(self, text):
+        """Buffer streamed text and schedule a coalesced flush (called from worker thread)"""
+        with self._chunk_lock:
+            self._chunk_buffer.append(text)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.root.after(33, self._flush_chunks)
+    
+    def _flush_chunks(self):
+        """Insert all buffered chunks with a single widget update (called from main thread)"""
+        with self._chunk_lock:
+            joined = "".join(self._chunk_buffer)
+            self._chunk_buffer.clear()
+            self._flush_scheduled = False
+        if not joined:
+            return
+        # Detach the scrollbar while inserting so it is only updated once per flush
+        yscrollcommand = self.output_text.cget("yscrollcommand")
+        self.output_text.configure(yscrollcommand="")
+        self.output_text.insert(tk.END, joined, "response")
+        self.output_text.configure(yscrollcommand=yscrollcommand)
+        self._trim_output()
+        if self.auto_scroll:
+            self.output_text.see(tk.END)
+    
+    def _trim_output(self, force=False):
+        """Drop the oldest lines so the output keeps at most MAX_OUTPUT_LINES
+        
+        Runs at most once a second unless force is set.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_trim < 1.0:
+            return
+        self._last_trim = now
+        line_count = int(self.output_text.index("end-1c").split(".")[0])
+        if line_count > MAX_OUTPUT_LINES:
+            self.output_text.delete("1.0", f"{line_count - MAX_OUTPUT_LINES + 1}.0")
     
     def _append_output(self, text):
         """Append text to output (called from main thread)"""
+        # Keep ordering with any streamed text still waiting to be flushed
+        self._flush_chunks()
         self.output_text.insert(tk.END, text, "response")
+        self._trim_output()
         # Only auto-scroll if the flag is set
         if self.auto_scroll:
             self.output_text.see(tk.END)
     
     def _generation_complete(self):
         """Called when generation is complete"""
+        # Show any remaining streamed text and enforce the line cap even if
+        # the last flush fell inside the trim interval
+        self._flush_chunks()
+        self._trim_output(force=True)
         self.is_generating = False
         self.generate_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
@@ -406,12 +612,41 @@ class OllamaGUI:
     
     def stop_generation(self):
         """Stop the current generation"""
-        self.is_generating = False
+        self._cancel_evt.set()
+        self._close_active_response()
         self.update_status("Stopping...", "orange")
     
+    def _close_active_response(self):
+        """Close the in-flight streaming response so the server stops generating"""
+        resp = self._active_resp
+        if resp is None:
+            return
+        # close() waits for the reader thread's pending socket read, which only
+        # returns when the server sends more data; shutting the socket down
+        # first wakes the reader immediately
+        sock = getattr(getattr(resp.raw, "_connection", None), "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # Already closed by the peer
+        resp.close()
+    
     def clear_output(self):
         """Clear the output text"""
         self.output_text.delete("1.0", tk.END)
+    
+    def _on_close(self):
+        """Close the HTTP session and destroy the window"""
+        self._closed = True
+        self._cancel_evt.set()
+        self._close_active_response()
+        # Pool workers are not daemon threads: an in-flight /api/tags or
+        # /api/show request still finishes (up to its 5 s timeout) before the
+        # interpreter exits; its result is discarded by _post_to_ui.
+        self._io_pool.shutdown(wait=False, cancel_futures=True)
+        close_session()
+        self.root.destroy()
 
 
 def main():